@@ -0,0 +1,78 @@
+# cython: language_level=3, boundscheck=False, wraparound=False
+# Optional accelerator for graph_langgraph: pulls every prompt slot out in one scan.
+# Build in place with:  cythonize -i src/_fast_parse.pyx
+# Mirrors the regexes in graph_langgraph (_PRICE_RE, _ZIP_RE, _ORDER_RE, _EMAIL_RE).
+
+cdef inline bint _alpha(Py_UCS4 c):
+    return (u'a' <= c <= u'z') or (u'A' <= c <= u'Z')
+
+cdef inline bint _word(Py_UCS4 c):
+    return c.isalnum() or c == u'_'
+
+cdef inline bint _local(Py_UCS4 c):
+    return _alpha(c) or (u'0' <= c <= u'9') or c in u'._%+-'
+
+cdef inline bint _domain(Py_UCS4 c):
+    return _alpha(c) or (u'0' <= c <= u'9') or c == u'.' or c == u'-'
+
+cdef inline bint _under_at(str p, Py_ssize_t i, Py_ssize_t n):
+    # case-insensitive "under" (the regex runs on prompt.lower())
+    if i + 5 > n:
+        return False
+    return (p[i] in u'uU' and p[i + 1] in u'nN' and p[i + 2] in u'dD'
+            and p[i + 3] in u'eE' and p[i + 4] in u'rR')
+
+cpdef tuple parse_prompt(str p):
+    """Return (price_cap, zip, order_id, email); each is None when absent."""
+    cdef Py_ssize_t n = len(p), i, j, k, b, e, d
+    cdef Py_UCS4 c
+    price = zip_code = order_id = email = None
+    for i in range(n):
+        c = p[i]
+        if price is None and (c == u'u' or c == u'U') and _under_at(p, i, n):
+            k = i + 5
+            while k < n and p[k].isspace():
+                k += 1
+            if k < n and p[k] == u'$':
+                k += 1
+            while k < n and p[k].isspace():
+                k += 1
+            j = k
+            while j < n and p[j].isdecimal():
+                j += 1
+            if j > k:
+                price = float(p[k:j])
+        if c.isdecimal():
+            if zip_code is None and (i == 0 or not _word(p[i - 1])):
+                j = i
+                while j < n and p[j].isdecimal():
+                    j += 1
+                if 5 <= j - i <= 6 and (j == n or not _word(p[j])):
+                    zip_code = p[i:j]
+        elif order_id is None and _alpha(c):
+            j = i + 1
+            while j < n and p[j].isdecimal():
+                j += 1
+            if j - i > 4:
+                order_id = p[i:j]
+        elif email is None and c == u'@':
+            b = i
+            while b > 0 and _local(p[b - 1]):
+                b -= 1
+            e = i + 1
+            while e < n and _domain(p[e]):
+                e += 1
+            # greedy domain: last '.' that still leaves two letters after it
+            d = e - 1
+            while d >= i + 2:
+                if p[d] == u'.' and d + 2 < n and _alpha(p[d + 1]) and _alpha(p[d + 2]):
+                    break
+                d -= 1
+            if b < i and d >= i + 2:
+                j = d + 1
+                while j < n and _alpha(p[j]):
+                    j += 1
+                email = p[b:j]
+        if price is not None and zip_code is not None and order_id is not None and email is not None:
+            break
+    return price, zip_code, order_id, email
@@ -1,11 +1,21 @@
 
 from __future__ import annotations
-from typing import TypedDict, List, Dict, Any, Optional
-import os, re, json
+from typing import List, Dict, Any, Optional
+from dataclasses import dataclass, field
+import os, re, json, asyncio, hashlib, threading, weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pydantic import BaseModel, Field
 from datetime import datetime
 # LangGraph
 from langgraph.graph import StateGraph, END
+from langchain_core.runnables import RunnableLambda
+
+try:
+    import ahocorasick  # pyahocorasick; optional single-pass keyword matcher
+except ImportError:
+    ahocorasick = None
 
 # Local tools
 try:
@@ -13,6 +23,15 @@ try:
 except Exception:
     import tools
 
+# Optional compiled slot scanner (src/_fast_parse.pyx); regexes below are the fallback
+try:
+    from . import _fast_parse
+except ImportError:
+    try:
+        import _fast_parse
+    except ImportError:
+        _fast_parse = None
+
 # ---------- LLM helper ----------
 import os
 
@@ -21,193 +40,430 @@ def use_llm() -> bool:
     has_any_key = bool(os.getenv("OPENAI_API_KEY") or os.getenv("GEMINI_API_KEY"))
     return has_any_key and not os.getenv("USE_MOCK_LLM")
 
-def call_llm(system: str, user: str) -> str:
+# genai.configure is process-global and models bind the default client on first use,
+# so models are cached by name only and dropped whenever the configured key changes
+_GEMINI_KEY_LOCK = threading.Lock()
+_GEMINI_CONFIGURED_KEY = None
+
+@lru_cache(maxsize=4)
+def _gemini_model_for(model_name: str):
+    import google.generativeai as genai
+    return genai.GenerativeModel(model_name)
+
+def _gemini_model(api_key: str | None, model_name: str):
+    global _GEMINI_CONFIGURED_KEY
+    with _GEMINI_KEY_LOCK:
+        if api_key != _GEMINI_CONFIGURED_KEY:
+            import google.generativeai as genai
+            genai.configure(api_key=api_key)
+            _GEMINI_CONFIGURED_KEY = api_key
+            _gemini_model_for.cache_clear()
+        return _gemini_model_for(model_name)
+
+# temperature 0 on both providers, so a cached reply matches what a fresh call would produce
+_GEMINI_GENERATION_CONFIG = {"temperature": 0}
+
+def _gemini_request(system: str, user: str) -> tuple:
+    # (model, prompt)
+    model = _gemini_model(os.getenv("GEMINI_API_KEY"), os.getenv("GEMINI_MODEL", "gemini-1.5-flash"))
+    return model, _gemini_prompt(system, user)
+
+def _openai_request(system: str, user: str) -> Dict[str, Any]:
+    # Fixed text lives in the system message and leads the request, so the shared prefix is
+    # eligible for OpenAI's automatic prompt caching once prompts reach its size threshold.
+    return dict(
+        model=os.getenv("OPENAI_MODEL", "gpt-4o-mini"),
+        messages=[{"role":"system","content":system},{"role":"user","content":user}],
+        temperature=0,
+    )
+
+@lru_cache(maxsize=4)
+def _openai_client(api_key: str | None):
+    from openai import OpenAI
+    return OpenAI(api_key=api_key)
+
+# loop -> {api_key: AsyncOpenAI}; the async transport is bound to the loop it first ran on.
+# Weak keys so finished loops aren't pinned; aclose_llm_clients() closes a loop's clients.
+_ASYNC_OPENAI_CLIENTS: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+def _async_openai_client(api_key: str | None):
+    clients = _ASYNC_OPENAI_CLIENTS.setdefault(asyncio.get_running_loop(), {})
+    client = clients.get(api_key)
+    if client is None:
+        from openai import AsyncOpenAI
+        client = clients[api_key] = AsyncOpenAI(api_key=api_key)
+    return client
+
+async def aclose_llm_clients() -> None:
+    # Close the async LLM clients opened on the running loop
+    clients = _ASYNC_OPENAI_CLIENTS.pop(asyncio.get_running_loop(), {})
+    for client in clients.values():
+        await client.close()
+
+def _use_gemini() -> bool:
     provider = (os.getenv("PROVIDER") or "").lower()
-    if provider == "gemini" or os.getenv("GEMINI_API_KEY"):
+    return provider == "gemini" or bool(os.getenv("GEMINI_API_KEY"))
+
+def _gemini_prompt(system: str, user: str) -> str:
+    # Gemini has no separate "system" role; prefix system rules to the prompt.
+    return f"{system.strip()}\n\nUser:\n{user.strip()}"
+
+# Replies keyed by sha256(provider/model, system, user); in-process LRU, plus an
+# optional on-disk diskcache when LLM_CACHE_DIR is set
+_LLM_CACHE_MAX = 1024
+_LLM_CACHE: OrderedDict = OrderedDict()
+_LLM_CACHE_LOCK = threading.Lock()
+_LLM_DISK_CACHE = None
+
+def _llm_cache_key(system: str, user: str) -> str:
+    target = (f"gemini:{os.getenv('GEMINI_MODEL', 'gemini-1.5-flash')}" if _use_gemini()
+              else f"openai:{os.getenv('OPENAI_MODEL', 'gpt-4o-mini')}")
+    return hashlib.sha256("\x00".join((target, system, user)).encode("utf-8")).hexdigest()
+
+def _llm_disk_cache():
+    global _LLM_DISK_CACHE
+    cache_dir = os.getenv("LLM_CACHE_DIR")
+    if not cache_dir:
+        return None
+    if _LLM_DISK_CACHE is None:
+        try:
+            import diskcache
+        except ImportError:
+            return None
+        _LLM_DISK_CACHE = diskcache.Cache(cache_dir)
+    return _LLM_DISK_CACHE
+
+def _llm_cache_get(key: str) -> Optional[str]:
+    with _LLM_CACHE_LOCK:
+        text = _LLM_CACHE.get(key)
+        if text is not None:
+            _LLM_CACHE.move_to_end(key)
+            return text
+    disk = _llm_disk_cache()
+    text = disk.get(key) if disk is not None else None
+    if text is not None:
+        _llm_cache_put(key, text, persist=False)
+    return text
+
+def _llm_cache_put(key: str, text: str, persist: bool = True) -> None:
+    if not text:
+        return  # don't pin empty/failed replies
+    with _LLM_CACHE_LOCK:
+        _LLM_CACHE[key] = text
+        _LLM_CACHE.move_to_end(key)
+        if len(_LLM_CACHE) > _LLM_CACHE_MAX:
+            _LLM_CACHE.popitem(last=False)
+    disk = _llm_disk_cache() if persist else None
+    if disk is not None:
+        disk.set(key, text)
+
+def call_llm(system: str, user: str) -> str:
+    key = _llm_cache_key(system, user)
+    text = _llm_cache_get(key)
+    if text is None:
+        text = _call_llm_uncached(system, user)
+        _llm_cache_put(key, text)
+    return text
+
+async def call_llm_async(system: str, user: str) -> str:
+    key = _llm_cache_key(system, user)
+    text = _llm_cache_get(key)
+    if text is None:
+        text = await _call_llm_async_uncached(system, user)
+        _llm_cache_put(key, text)
+    return text
+
+def _call_llm_uncached(system: str, user: str) -> str:
+    if _use_gemini():
         # ---------- Google Gemini ----------
-        import google.generativeai as genai
-        genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-        model_name = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
-        model = genai.GenerativeModel(model_name)
-        # Gemini has no separate "system" role; prefix system rules to the prompt.
-        prompt = f"{system.strip()}\n\nUser:\n{user.strip()}"
-        resp = model.generate_content(prompt)
+        model, prompt = _gemini_request(system, user)
+        resp = model.generate_content(prompt, generation_config=_GEMINI_GENERATION_CONFIG)
         # Handle both text and potential empty parts safely
         return (resp.text or "").strip()
     else:
         # ---------- OpenAI (default) ----------
-        from openai import OpenAI
-        client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        resp = client.chat.completions.create(
-            model=os.getenv("OPENAI_MODEL", "gpt-4o-mini"),
-            messages=[{"role":"system","content":system},{"role":"user","content":user}],
-            temperature=0.2,
-        )
+        client = _openai_client(os.getenv("OPENAI_API_KEY"))
+        resp = client.chat.completions.create(**_openai_request(system, user))
         return resp.choices[0].message.content.strip()
 
+async def _call_llm_async_uncached(system: str, user: str) -> str:
+    # Same providers as _call_llm_uncached, without blocking the event loop
+    if _use_gemini():
+        model, prompt = _gemini_request(system, user)
+        resp = await model.generate_content_async(prompt, generation_config=_GEMINI_GENERATION_CONFIG)
+        return (resp.text or "").strip()
+    client = _async_openai_client(os.getenv("OPENAI_API_KEY"))
+    resp = await client.chat.completions.create(**_openai_request(system, user))
+    return resp.choices[0].message.content.strip()
 
 # ---------- State ----------
-class AgentState(TypedDict, total=False):
-    prompt: str
-    intent: str
-    tools_called: List[str]
-    evidence: List[Dict[str, Any]]
-    policy_decision: Dict[str, Any] | None
-    final_message: str
+# slots: nodes read fields as attributes instead of hashing dict keys
+@dataclass(slots=True)
+class AgentState:
+    prompt: str = ""
+    intent: str = ""
+    tools_called: List[str] = field(default_factory=list)
+    evidence: List[Dict[str, Any]] = field(default_factory=list)
+    policy_decision: Dict[str, Any] | None = None
+    final_message: str = ""
     # working fields
-    order: Dict[str, Any] | None
-    order_id: str | None
-    email: str | None
-    products: List[Dict[str, Any]]
-    size: Dict[str, Any]
-    eta: Dict[str, Any]
+    order: Dict[str, Any] | None = None
+    order_id: str | None = None
+    email: str | None = None
+    products: List[Dict[str, Any]] | None = None
+    size: Dict[str, Any] | None = None
+    eta: Dict[str, Any] | None = None
+
+# Prompt slot extraction patterns, compiled once at import.
+_PRICE_RE = re.compile(r"under\s*\$?\s*(\d+)")
+_ZIP_RE = re.compile(r"(\b\d{5,6}\b)")
+_ORDER_RE = re.compile(r"(?:order\s*)?([A-Za-z]\d{4,})")
+_EMAIL_RE = re.compile(r"([A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,})")
+
+def _product_slots(prompt: str) -> tuple:
+    # (price_cap, zip)
+    if _fast_parse is not None:
+        return _fast_parse.parse_prompt(prompt)[:2]
+    m = _PRICE_RE.search(prompt.lower())
+    zm = _ZIP_RE.search(prompt)
+    return (float(m.group(1)) if m else None), (zm.group(1) if zm else None)
+
+def _order_slots(prompt: str) -> tuple:
+    # (order_id, email)
+    if _fast_parse is not None:
+        return _fast_parse.parse_prompt(prompt)[2:]
+    mo = _ORDER_RE.search(prompt)
+    me = _EMAIL_RE.search(prompt)
+    return (mo.group(1) if mo else None), (me.group(1) if me else None)
+
+# Shared pool for independent tool calls within one request
+_TOOL_POOL = ThreadPoolExecutor(max_workers=3, thread_name_prefix="tool")
 
 SYSTEM = """You are EvoAI Agent. Follow policy strictly: product assist vs order help, 60-min cancel rule, no fake discounts. Be concise."""
 
+# ---------- Reply templates ----------
+_RESPONDER_INSTRUCTION = (
+    "Compose the final user reply. Do not invent facts; only use fields in context. "
+    "If product_assist: list up to 2 items with title, price, sizes; give size tip and ETA. "
+    "If order_help and cancel_allowed: confirm cancellation. "
+    "If blocked: explain 60-min policy and offer at least two alternatives. "
+    "If other: refuse discount code creation and suggest perks."
+)
+# Responder system prompt: the fixed instruction sits in the shared prefix, only the
+# per-request context goes in the user turn
+_RESPONDER_SYSTEM = f"{SYSTEM}\n\n{_RESPONDER_INSTRUCTION}"
+_MSG_NO_PRODUCTS = "I couldn't find items that match your filters. If you can relax the budget or tags, I can search again."
+_MSG_PRODUCT_LINE = "• {title} — ${price} | sizes: {sizes}"
+_MSG_PRODUCTS = ("Here are two options under your budget:\n{lines}\n\n"
+                 "Size tip: go **{rec}**. {rationale}\n"
+                 "ETA to {zip}: {eta_window}.")
+_MSG_ORDER_NOT_FOUND = "I couldn’t verify that order. Please double-check the order ID and email, or I can hand you to support."
+_MSG_CANCELLED = "✅ Order {order_id} is cancelled successfully. You’ll see a confirmation email shortly."
+_MSG_BLOCKED = ("❌ I can’t cancel order {order_id} because our policy allows cancellations only within 60 minutes of purchase ({reason}).\n"
+                "Next best options:\n• Edit the delivery address (if the carrier hasn’t picked it up)\n• Convert to store credit after delivery\n• Or I can hand you off to a human agent")
+_MSG_NO_DISCOUNTS = ("I can’t generate custom discount codes. You can still save by:\n"
+                     "• Joining our newsletter for first-order perks\n• Watching seasonal sales on the site\n• Building a wishlist so we alert you if prices drop")
+
 # ---------- Nodes ----------
+_INTENTS = ("product_assist", "order_help", "other")
+# Deterministic router keywords; order_help wins over product_assist when both appear
+_ORDER_KEYWORDS = ("cancel order", "order status", "order help", "where is my order", "order ", "refund")
+_PRODUCT_KEYWORDS = ("dress","product","wedding","midi","size","eta","zip")
+
+def _build_router_automaton():
+    if ahocorasick is None:
+        return None
+    A = ahocorasick.Automaton()
+    for kw in _PRODUCT_KEYWORDS:
+        A.add_word(kw, "product_assist")
+    for kw in _ORDER_KEYWORDS:
+        A.add_word(kw, "order_help")
+    A.make_automaton()
+    return A
+
+_ROUTER_AUTOMATON = _build_router_automaton()
+
+def _keyword_intent(low: str) -> str:
+    if _ROUTER_AUTOMATON is not None:
+        intent = "other"
+        for _, hit in _ROUTER_AUTOMATON.iter(low):
+            if hit == "order_help":
+                return hit
+            intent = hit
+        return intent
+    if any(k in low for k in _ORDER_KEYWORDS):
+        return "order_help"
+    if any(k in low for k in _PRODUCT_KEYWORDS):
+        return "product_assist"
+    return "other"
+
+# Past this many rows per classification call the per-call savings flatten out
+_BATCH_CLASSIFY_MAX = 16
+
+def _label_to_intent(text: str) -> str:
+    return "product_assist" if "product" in text else "order_help" if "order" in text else "other"
+
+def _classify_request(prompt: str) -> str:
+    return f"Classify into one of: product_assist, order_help, other\nUser: {prompt}"
+
 def router_node(state: AgentState) -> AgentState:
-    p = state["prompt"]
-    if use_llm():
-        text = call_llm(SYSTEM, f"Classify into one of: product_assist, order_help, other\nUser: {p}")
-        intent = "product_assist" if "product" in text else "order_help" if "order" in text else "other"
+    p = state.prompt
+    if state.intent in _INTENTS:
+        # already classified upstream (see run_agent_batch)
+        intent = state.intent
+    elif use_llm():
+        intent = _label_to_intent(call_llm(SYSTEM, _classify_request(p)))
     else:
-        low = p.lower()
-        if any(k in low for k in ["cancel order", "order status", "order help", "where is my order", "order ", "refund"]):
-            intent = "order_help"
-        elif any(k in low for k in ["dress","product","wedding","midi","size","eta","zip"]):
-            intent = "product_assist"
-        else:
-            intent = "other"
-    state["intent"] = intent
-    state["tools_called"] = []
-    state["evidence"] = []
+        intent = _keyword_intent(p.lower())
+    state.intent = intent
+    state.tools_called = []
+    state.evidence = []
+    return state
+
+def _product_tool_calls(prompt: str) -> List[tuple]:
+    # (tool, args) for product_assist; the three tools are independent of each other
+    price_cap, zip_code = _product_slots(prompt)
+    low = prompt.lower()
+    tags = []
+    if "wedding" in low: tags.append("wedding")
+    if "midi" in low: tags.append("midi")
+    return [
+        (tools.product_search, (prompt, price_cap, tags or None)),
+        (tools.size_recommender, (prompt,)),
+        (tools.eta, (zip_code or "00000",)),
+    ]
+
+def _set_product_results(state: AgentState, products, size, eta) -> AgentState:
+    picks = products[:2]
+    state.products = picks
+    state.size = size
+    state.eta = eta
+    # build new lists rather than mutating, so stream_agent events stay per-node snapshots
+    state.tools_called = [*state.tools_called, "product_search", "size_recommender", "eta"]
+    state.evidence = [*state.evidence, *({"id": p["id"], "title": p["title"], "price": p["price"], "sizes": p["sizes"]} for p in picks)]
     return state
 
 def tool_selector_node(state: AgentState) -> AgentState:
-    intent = state["intent"]
-    prompt = state["prompt"]
-    tools_called = state["tools_called"]
+    intent = state.intent
+    prompt = state.prompt
 
     if intent == "product_assist":
-        price_cap = None
-        m = re.search(r"under\s*\$?\s*(\d+)", prompt.lower())
-        if m: price_cap = float(m.group(1))
-        tags = []
-        if "wedding" in prompt.lower(): tags.append("wedding")
-        if "midi" in prompt.lower(): tags.append("midi")
-        products = tools.product_search(prompt, price_cap, tags or None)
-        tools_called.append("product_search")
-
-        size = tools.size_recommender(prompt); tools_called.append("size_recommender")
-        zm = re.search(r"(\b\d{5,6}\b)", prompt)
-        eta = tools.eta(zm.group(1) if zm else "00000"); tools_called.append("eta")
-        picks = products[:2]
-        state["products"] = picks
-        state["size"] = size
-        state["eta"] = eta
-        state["evidence"].extend([{"id": p["id"], "title": p["title"], "price": p["price"], "sizes": p["sizes"]} for p in picks])
+        # dispatch together so I/O-bound tools overlap
+        futures = [_TOOL_POOL.submit(fn, *args) for fn, args in _product_tool_calls(prompt)]
+        _set_product_results(state, *(f.result() for f in futures))
 
     elif intent == "order_help":
-        mo = re.search(r"(?:order\s*)?([A-Za-z]\d{4,})", prompt)
-        me = re.search(r"([A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,})", prompt)
-        oid = mo.group(1) if mo else None
-        email = me.group(1) if me else None
+        oid, email = _order_slots(prompt)
         order = tools.order_lookup(oid, email) if (oid and email) else None
-        tools_called.append("order_lookup")
-        state["order_id"] = oid; state["email"] = email; state["order"] = order
-        state["evidence"].append({"order_id": oid, "email": email, "found": bool(order)})
+        state.order_id = oid; state.email = email; state.order = order
+        # new lists, as in _set_product_results
+        state.tools_called = [*state.tools_called, "order_lookup"]
+        state.evidence = [*state.evidence, {"order_id": oid, "email": email, "found": bool(order)}]
 
-    state["tools_called"] = tools_called
     return state
 
 def policy_guard_node(state: AgentState) -> AgentState:
-    if state["intent"] != "order_help":
-        state["policy_decision"] = None
-        return state
-    order = state.get("order")
+    # Only reached for order_help (see _needs_policy)
+    order = state.order
     if not order:
-        state["policy_decision"] = {"cancel_allowed": False, "reason":"order_not_found_or_missing_credentials"}
+        state.policy_decision = {"cancel_allowed": False, "reason":"order_not_found_or_missing_credentials"}
         return state
     decision = tools.order_cancel(order["order_id"])
-    state["policy_decision"] = decision
+    state.policy_decision = decision
     return state
 
+def _responder_request(state: AgentState) -> str:
+    # LLM composes final message with structured state context
+    context = json.dumps({
+        "intent": state.intent,
+        "evidence": state.evidence,
+        "policy_decision": state.policy_decision,
+        "products": state.products,
+        "size": state.size,
+        "eta": state.eta,
+        "order": state.order,
+    }, indent=2)
+    return f"Context:\n{context}"
+
 def responder_node(state: AgentState) -> AgentState:
-    intent = state["intent"]
+    intent = state.intent
     if use_llm():
-        # LLM composes final message with structured state context
-        context = json.dumps({
-            "intent": intent,
-            "evidence": state.get("evidence", []),
-            "policy_decision": state.get("policy_decision"),
-            "products": state.get("products"),
-            "size": state.get("size"),
-            "eta": state.get("eta"),
-            "order": state.get("order"),
-        }, indent=2)
-        instruction = (
-            "Compose the final user reply. Do not invent facts; only use fields in context. "
-            "If product_assist: list up to 2 items with title, price, sizes; give size tip and ETA. "
-            "If order_help and cancel_allowed: confirm cancellation. "
-            "If blocked: explain 60-min policy and offer at least two alternatives. "
-            "If other: refuse discount code creation and suggest perks."
-        )
-        msg = call_llm(SYSTEM, f"{instruction}\n\nContext:\n{context}")
+        msg = call_llm(_RESPONDER_SYSTEM, _responder_request(state))
     else:
         # deterministic fallback
         if intent == "product_assist":
-            picks = state.get("products", [])
-            size = state.get("size", {})
-            eta = state.get("eta", {})
+            picks = state.products or []
+            size = state.size or {}
+            eta = state.eta or {}
             if not picks:
-                msg = "I couldn't find items that match your filters. If you can relax the budget or tags, I can search again."
+                msg = _MSG_NO_PRODUCTS
             else:
-                lines = [f"• {it['title']} — ${it['price']} | sizes: {', '.join(it['sizes'])}" for it in picks]
-                rec = size.get("recommended", "M")
-                rationale = size.get("rationale","")
-                eta_text = eta.get("eta_window","2–5 business days")
-                msg = ("Here are two options under your budget:\n" + "\n".join(lines) +
-                       f"\n\nSize tip: go **{rec}**. {rationale}\nETA to {eta.get('zip')}: {eta_text}.")
+                lines = "\n".join(_MSG_PRODUCT_LINE.format(title=it["title"], price=it["price"], sizes=", ".join(it["sizes"]))
+                                  for it in picks)
+                msg = _MSG_PRODUCTS.format(lines=lines, rec=size.get("recommended", "M"),
+                                           rationale=size.get("rationale", ""), zip=eta.get("zip"),
+                                           eta_window=eta.get("eta_window", "2–5 business days"))
         elif intent == "order_help":
-            decision = state.get("policy_decision", {})
-            order = state.get("order")
+            decision = state.policy_decision or {}
+            order = state.order
             if not order:
-                msg = "I couldn’t verify that order. Please double-check the order ID and email, or I can hand you to support."
+                msg = _MSG_ORDER_NOT_FOUND
             elif decision.get("cancel_allowed"):
-                msg = f"✅ Order {order['order_id']} is cancelled successfully. You’ll see a confirmation email shortly."
+                msg = _MSG_CANCELLED.format(order_id=order["order_id"])
             else:
-                reason = decision.get("reason", ">60 min")
-                msg = (f"❌ I can’t cancel order {order['order_id']} because our policy allows cancellations only within 60 minutes of purchase ({reason}).\n"
-                       "Next best options:\n• Edit the delivery address (if the carrier hasn’t picked it up)\n• Convert to store credit after delivery\n• Or I can hand you off to a human agent")
+                msg = _MSG_BLOCKED.format(order_id=order["order_id"], reason=decision.get("reason", ">60 min"))
         else:
-            msg = ("I can’t generate custom discount codes. You can still save by:\n"
-                   "• Joining our newsletter for first-order perks\n• Watching seasonal sales on the site\n• Building a wishlist so we alert you if prices drop")
-    state["final_message"] = msg
+            msg = _MSG_NO_DISCOUNTS
+    state.final_message = msg
     return state
 
-def trace_node(state: AgentState) -> AgentState:
-    # This node exists so you can introspect state if running LangGraph streaming
+# Async twins used by graph.ainvoke: await the LLM, then reuse the sync node body
+async def arouter_node(state: AgentState) -> AgentState:
+    if state.intent not in _INTENTS and use_llm():
+        state.intent = _label_to_intent(await call_llm_async(SYSTEM, _classify_request(state.prompt)))
+    return router_node(state)
+
+async def atool_selector_node(state: AgentState) -> AgentState:
+    # Await the pooled product tools instead of blocking the loop on Future.result()
+    if state.intent != "product_assist":
+        return tool_selector_node(state)
+    futures = [asyncio.wrap_future(_TOOL_POOL.submit(fn, *args)) for fn, args in _product_tool_calls(state.prompt)]
+    return _set_product_results(state, *await asyncio.gather(*futures))
+
+async def aresponder_node(state: AgentState) -> AgentState:
+    if not use_llm():
+        return responder_node(state)
+    state.final_message = await call_llm_async(_RESPONDER_SYSTEM, _responder_request(state))
     return state
 
 # ---------- Build graph ----------
+def _needs_policy(state: AgentState) -> str:
+    # Only order_help has a policy to check; everything else goes straight to the reply
+    return "policy_guard" if state.intent == "order_help" else "responder"
+
 def build_graph():
     g = StateGraph(AgentState)
-    g.add_node("router", router_node)
-    g.add_node("tool_selector", tool_selector_node)
+    g.add_node("router", RunnableLambda(router_node, afunc=arouter_node))
+    g.add_node("tool_selector", RunnableLambda(tool_selector_node, afunc=atool_selector_node))
     g.add_node("policy_guard", policy_guard_node)
-    g.add_node("responder", responder_node)
-    g.add_node("trace", trace_node)
+    g.add_node("responder", RunnableLambda(responder_node, afunc=aresponder_node))
     g.set_entry_point("router")
     g.add_edge("router", "tool_selector")
-    g.add_edge("tool_selector", "policy_guard")
+    g.add_conditional_edges("tool_selector", _needs_policy, {"policy_guard": "policy_guard", "responder": "responder"})
     g.add_edge("policy_guard", "responder")
-    g.add_edge("responder", "trace")
-    g.add_edge("trace", END)
+    g.add_edge("responder", END)
     return g.compile()
 
-def run_agent(prompt: str) -> Dict[str, Any]:
-    graph = build_graph()
-    out = graph.invoke({"prompt": prompt})
+_GRAPH = None
+
+def _get_graph():
+    # Compile once per process; the compiled graph is reused across calls
+    global _GRAPH
+    if _GRAPH is None:
+        _GRAPH = build_graph()
+    return _GRAPH
+
+def _result(out: Dict[str, Any]) -> Dict[str, Any]:
     trace = {
         "intent": out.get("intent"),
         "tools_called": out.get("tools_called", []),
@@ -217,6 +473,56 @@ def run_agent(prompt: str) -> Dict[str, Any]:
     }
     return {"trace": trace, "reply": out.get("final_message","")}
 
+def run_agent(prompt: str) -> Dict[str, Any]:
+    return _result(_get_graph().invoke({"prompt": prompt}))
+
+def stream_agent(prompt: str):
+    # (node name, state after that node) pairs, for introspecting a run step by step
+    for event in _get_graph().stream({"prompt": prompt}, stream_mode="updates"):
+        yield from event.items()
+
+def _classify_batch(prompts: List[str]) -> List[Optional[str]]:
+    # One LLM call labels every prompt; None means "let router_node decide".
+    # Prompts go in as a JSON array so embedded newlines can't shift the label count.
+    text = call_llm(SYSTEM, "Classify each prompt in this JSON array; return only a JSON array of labels "
+                            "of the same length and order, each one of: product_assist|order_help|other\n"
+                            f"{json.dumps(prompts, ensure_ascii=False)}")
+    try:
+        labels = json.loads(text.strip().removeprefix("```json").strip("`"))
+    except ValueError:
+        return [None] * len(prompts)
+    if not isinstance(labels, list) or len(labels) != len(prompts):
+        return [None] * len(prompts)
+    return [_label_to_intent(str(lbl)) for lbl in labels]
+
+def run_agent_batch(prompts: List[str]) -> List[Dict[str, Any]]:
+    intents: List[Optional[str]] = [None] * len(prompts)
+    if use_llm():
+        for i in range(0, len(prompts), _BATCH_CLASSIFY_MAX):
+            intents[i:i + _BATCH_CLASSIFY_MAX] = _classify_batch(prompts[i:i + _BATCH_CLASSIFY_MAX])
+    graph = _get_graph()
+    results = []
+    for p, intent in zip(prompts, intents):
+        state = {"prompt": p}
+        if intent:
+            state["intent"] = intent
+        results.append(_result(graph.invoke(state)))
+    return results
+
+async def run_agent_async(prompt: str) -> Dict[str, Any]:
+    return _result(await _get_graph().ainvoke({"prompt": prompt}))
+
+async def run_agents_async(prompts: List[str], qpm_limit: int = 500) -> List[Dict[str, Any]]:
+    # Fan out many prompts at once, capped to stay inside the provider's requests-per-minute
+    sem = asyncio.Semaphore(max(1, qpm_limit // 60))
+    async def one(p: str) -> Dict[str, Any]:
+        async with sem:
+            return await run_agent_async(p)
+    try:
+        return await asyncio.gather(*(one(p) for p in prompts))
+    finally:
+        await aclose_llm_clients()
+
 if __name__ == "__main__":
     res = run_agent("Wedding guest, midi, under $120 — I’m between M/L. ETA to 560001?")
     print(json.dumps(res["trace"], indent=2))
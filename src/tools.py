@@ -1,47 +1,149 @@
 
 from __future__ import annotations
-import json, os, re
+import heapq, json, os, re
 from pathlib import Path
 from typing import List, Dict, Any, Optional
 from datetime import datetime, timezone
 
+try:
+    import orjson
+except ImportError:  # optional; stdlib json is the fallback
+    orjson = None
+
+try:
+    import numpy as np
+except ImportError:  # optional; product_search stays pure Python without it
+    np = None
+
 DATA_DIR = Path(__file__).resolve().parents[1] / "data"
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+# Query tokens that carry no product signal
+_STOPWORDS = frozenset({"under","less","budget","m","l","xl","s","eta","to","guest","between","im","i","zip"})
+
+# name -> (st_mtime_ns, parsed data); re-read only when the file changes on disk
+_JSON_CACHE: Dict[str, tuple] = {}
 
 def _load_json(name: str) -> Any:
-    with open(DATA_DIR / name, "r", encoding="utf-8") as f:
-        return json.load(f)
+    path = DATA_DIR / name
+    mtime = path.stat().st_mtime_ns
+    hit = _JSON_CACHE.get(name)
+    if hit is not None and hit[0] == mtime:
+        return hit[1]
+    if orjson is not None:
+        data = orjson.loads(path.read_bytes())
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    _JSON_CACHE[name] = (mtime, data)
+    return data
+
+# (orders list, by_id_email, by_id, parsed created_at by id); rebuilt whenever
+# _load_json hands back a new list. created_at is parsed lazily per id in order_cancel,
+# so one malformed timestamp only affects that order.
+_ORDERS_INDEX: tuple = (None, {}, {}, {})
+
+def _orders_indexed() -> tuple:
+    global _ORDERS_INDEX
+    orders = _load_json("orders.json")
+    if _ORDERS_INDEX[0] is not orders:
+        by_id_email, by_id = {}, {}
+        for o in orders:
+            # setdefault keeps the first match, as the old linear scan did
+            oid = o["order_id"].lower()
+            by_id_email.setdefault((oid, o["email"].lower()), o)
+            by_id.setdefault(oid, o)
+        _ORDERS_INDEX = (orders, by_id_email, by_id, {})
+    return _ORDERS_INDEX
+
+# Catalog size from which NumPy masks beat the per-row Python checks
+_VECTORIZE_MIN = 256
+
+# (products list, precomputed search rows, column arrays or None); rebuilt whenever
+# _load_json hands back a new list
+_PRODUCTS_INDEX: tuple = (None, [], None)
+
+def _product_columns(rows: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    if np is None or len(rows) < _VECTORIZE_MIN:
+        return None
+    tag_ids: Dict[str, int] = {}
+    for row in rows:
+        for t in row["tags_lower"]:
+            tag_ids.setdefault(t, len(tag_ids))
+    tag_masks = None
+    if len(tag_ids) <= 64:  # one bit per tag in a uint64
+        tag_masks = np.array([sum(1 << tag_ids[t] for t in row["tags_lower"]) for row in rows], dtype=np.uint64)
+    return {
+        "prices": np.array([row["price"] for row in rows], dtype=np.float64),
+        "tag_ids": tag_ids,
+        "tag_masks": tag_masks,
+    }
+
+def _products_indexed() -> tuple:
+    global _PRODUCTS_INDEX
+    items = _load_json("products.json")
+    if _PRODUCTS_INDEX[0] is not items:
+        rows = [{
+            "item": it,
+            "price": it["price"],
+            "tags_lower": frozenset(t.lower() for t in it.get("tags", [])),
+            "haystack": " ".join([it["title"], " ".join(it.get("tags",[])), it.get("color","")]).lower(),
+        } for it in items]
+        _PRODUCTS_INDEX = (items, rows, _product_columns(rows))
+    return _PRODUCTS_INDEX[1], _PRODUCTS_INDEX[2]
+
+def _prefilter(rows: List[Dict[str, Any]], cols: Dict[str, Any], price_max: Optional[float],
+               tagset: Optional[frozenset]) -> List[Dict[str, Any]]:
+    # Narrow rows with vectorized price/tag masks; product_search still applies its own checks
+    mask = np.ones(len(rows), dtype=bool)
+    if price_max is not None:
+        mask &= cols["prices"] <= price_max
+    if tagset is not None and cols["tag_masks"] is not None:
+        tag_ids = cols["tag_ids"]
+        if not all(t in tag_ids for t in tagset):
+            return []
+        required = np.uint64(sum(1 << tag_ids[t] for t in tagset))
+        mask &= (cols["tag_masks"] & required) == required
+    return [rows[i] for i in np.flatnonzero(mask)]
 
 def parse_iso(ts: str) -> datetime:
     if ts.endswith("Z"):
         ts = ts[:-1] + "+00:00"
     return datetime.fromisoformat(ts)
 
+# (NOW_ISO value, parsed datetime); reparsed only when the env var changes
+_NOW_CACHE: tuple = (None, None)
+
 def utcnow() -> datetime:
+    global _NOW_CACHE
     now_env = os.getenv("NOW_ISO")
-    if now_env:
-        return parse_iso(now_env)
-    return datetime.now(timezone.utc)
+    if not now_env:
+        return datetime.now(timezone.utc)
+    if _NOW_CACHE[0] != now_env:
+        _NOW_CACHE = (now_env, parse_iso(now_env))
+    return _NOW_CACHE[1]
 
-def product_search(query: str = "", price_max: Optional[float] = None, tags: Optional[List[str]] = None) -> List[Dict[str, Any]]:
-    items = _load_json("products.json")
+def product_search(query: str = "", price_max: Optional[float] = None, tags: Optional[List[str]] = None, top_k: Optional[int] = 2) -> List[Dict[str, Any]]:
+    rows, cols = _products_indexed()
     q = (query or "").lower()
-    tokens = [t for t in re.findall(r"[a-z0-9]+", q) if t]
-    def matches(item):
-        if price_max is not None and item["price"] > price_max:
+    tokens = [t for t in _TOKEN_RE.findall(q) if t]
+    tagset = frozenset(t.lower() for t in tags) if tags else None
+    meaningful = [tok for tok in tokens if tok not in _STOPWORDS]
+    def matches(row):
+        if price_max is not None and row["price"] > price_max:
             return False
-        if tags:
-            tagset = set([t.lower() for t in tags])
-            if not tagset.issubset(set([t.lower() for t in item.get("tags",[])])):
-                return False
-            return True  # tag match is sufficient
-        if tokens:
-            hay = " ".join([item["title"], " ".join(item.get("tags",[])), item.get("color","")]).lower()
-            meaningful = [tok for tok in tokens if tok not in {"under","less","budget","m","l","xl","s","eta","to","guest","between","im","i","zip"}]
-            return any(tok in hay for tok in meaningful) if meaningful else True
+        if tagset is not None:
+            return tagset <= row["tags_lower"]  # tag match is sufficient
+        if meaningful:
+            hay = row["haystack"]
+            return any(tok in hay for tok in meaningful)
         return True
-    filtered = [it for it in items if matches(it)]
-    filtered.sort(key=lambda x: (x["price"], x["id"]))
-    return filtered
+    if cols is not None:
+        rows = _prefilter(rows, cols, price_max, tagset)
+    filtered = (row["item"] for row in rows if matches(row))
+    key = lambda x: (x["price"], x["id"])
+    if top_k is None:
+        return sorted(filtered, key=key)
+    return heapq.nsmallest(top_k, filtered, key=key)  # cheapest top_k without a full sort
 
 def size_recommender(user_inputs: str) -> Dict[str, Any]:
     text = (user_inputs or "").lower()
@@ -52,30 +154,29 @@ def size_recommender(user_inputs: str) -> Dict[str, Any]:
         rationale = "You prefer a looser fit; L should feel roomier. Choose M for a snugger fit."
     return {"recommended": rec, "rationale": rationale}
 
+# 2-digit zip prefix -> delivery window
+_ETA_MAP = {"56": "3–5 business days", "10": "2–3 business days", "11": "2–3 business days", "12": "2–3 business days"}
+_ETA_DEFAULT = "2–5 business days"
+
 def eta(zip_code: str) -> Dict[str, Any]:
     z = str(zip_code)
-    if z.startswith("56"):
-        window = "3–5 business days"
-    elif z.startswith(("10","11","12")):
-        window = "2–3 business days"
-    else:
-        window = "2–5 business days"
-    return {"zip": z, "eta_window": window}
+    return {"zip": z, "eta_window": _ETA_MAP.get(z[:2], _ETA_DEFAULT)}
 
 def order_lookup(order_id: str, email: str) -> Optional[Dict[str, Any]]:
-    orders = _load_json("orders.json")
-    for o in orders:
-        if o["order_id"].lower() == order_id.lower() and o["email"].lower() == email.lower():
-            return o
-    return None
+    _, by_id_email, _, _ = _orders_indexed()
+    return by_id_email.get((order_id.lower(), email.lower()))
 
 def order_cancel(order_id: str, timestamp_iso: Optional[str] = None) -> Dict[str, Any]:
-    orders = _load_json("orders.json")
-    order = next((o for o in orders if o["order_id"].lower() == order_id.lower()), None)
+    _, _, by_id, created_at = _orders_indexed()
+    oid = order_id.lower()
+    order = by_id.get(oid)
     if not order:
         return {"cancel_allowed": False, "reason": "order_not_found"}
-    created = parse_iso(order["created_at"])
+    created = created_at.get(oid)
+    if created is None:
+        created = created_at[oid] = parse_iso(order["created_at"])
     now = parse_iso(timestamp_iso) if timestamp_iso else utcnow()
+    # datetime subtraction (not .timestamp()) so naive vs aware input still raises TypeError
     delta = (now - created).total_seconds() / 60.0
     if delta <= 60.0 + 1e-9:
         return {"cancel_allowed": True, "reason": f"within_60_min ({delta:.1f} min)"}